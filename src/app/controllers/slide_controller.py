@@ -1,13 +1,24 @@
 from fastapi import HTTPException, UploadFile, status
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import asyncio
 import logging
+import re
+import numpy as np
 from datetime import datetime
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from ..database import get_pinecone_index
+from ..database import get_pinecone_index, EMBEDDING_DIMENSION
 from .. import utils
+from ..rate_limiter import RateLimiter
 from ..schemas.slide import Slide, SlideCreate, SlideInDB
 import os 
 
+try:
+    from google.api_core.exceptions import PermissionDenied, ResourceExhausted, Unauthenticated
+except ImportError:  # Not installed with every langchain-google-genai release
+    PermissionDenied = ResourceExhausted = Unauthenticated = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -15,9 +26,172 @@ logger = logging.getLogger(__name__)
 # Initialize Pinecone
 pinecone_index = get_pinecone_index()
 
+# Embedding clients are created once and shared across requests
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+doc_embeddings = GoogleGenerativeAIEmbeddings(
+    model=EMBEDDING_MODEL,
+    task_type="retrieval_document",  # Use retrieval_document for document embeddings
+    google_api_key=os.getenv("GOOGLE_API_KEY")
+)
+
+query_embeddings = GoogleGenerativeAIEmbeddings(
+    model=EMBEDDING_MODEL,
+    task_type="retrieval_query",  # Use retrieval_query for search queries
+    google_api_key=os.getenv("GOOGLE_API_KEY")
+)
+
+# Process pool for CPU-bound file parsing, managed by the app's startup/shutdown
+# hooks. When unset, parsing falls back to the default thread pool.
+parse_pool: Optional[ProcessPoolExecutor] = None
+
 # Maximum file size: 10MB
 MAX_FILE_SIZE = 10 * 1024 * 1024
 
+# Maximum number of texts sent in a single embedding request
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "96"))
+
+# Maximum number of vectors per Pinecone upsert request
+UPSERT_BATCH_SIZE = 100
+
+# Maximum number of IDs per Pinecone fetch request
+FETCH_BATCH_SIZE = 100
+
+# Stay below Pinecone's 2MB per-request limit
+MAX_UPSERT_REQUEST_BYTES = 2 * 1024 * 1024
+
+# Maximum number of embedding requests in flight at once
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "8"))
+
+# Google embedding quotas, shared by every upload in this process
+EMBED_REQUESTS_PER_MINUTE = int(os.getenv("EMBED_REQUESTS_PER_MINUTE", "1500"))
+EMBED_TOKENS_PER_MINUTE = int(os.getenv("EMBED_TOKENS_PER_MINUTE", "1000000"))
+
+# Retries with exponential backoff when the embedding API reports exhausted quota
+EMBED_MAX_RETRIES = 5
+EMBED_RETRY_BASE_DELAY = 1.0
+
+# Quota errors as they appear in the messages of wrapped API errors
+_RATE_LIMIT_MESSAGE = re.compile(r"\b429\b|RESOURCE_EXHAUSTED|Resource has been exhausted")
+
+embed_rate_limiter = RateLimiter(
+    max_concurrency=EMBED_CONCURRENCY,
+    requests_per_minute=EMBED_REQUESTS_PER_MINUTE,
+    tokens_per_minute=EMBED_TOKENS_PER_MINUTE
+)
+
+# Quantize vectors sent to Pinecone: "int8" or "none"
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "int8").lower()
+
+def quantize_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    """
+    Round embeddings to int8 levels, scaling each vector to use the full range.
+    
+    Cosine similarity ignores per-vector scale, so rankings only change by the
+    rounding error, while the serialized upsert and query payloads get much smaller.
+    """
+    if VECTOR_QUANTIZATION != "int8" or embeddings.size == 0:
+        return embeddings
+    
+    matrix = np.atleast_2d(embeddings)
+    scale = np.abs(matrix).max(axis=1, keepdims=True)
+    scale[scale == 0] = 1.0
+    quantized = np.round(matrix / scale * 127).clip(-127, 127).astype(np.float32)
+    return quantized.reshape(np.shape(embeddings))
+
+# Number of distinct search queries whose embeddings are kept in memory
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _embed_query(query: str) -> Tuple[float, ...]:
+    """Embed a search query, quantized like the stored vectors and cached by query text."""
+    embedding = query_embeddings.embed_query(query)
+    return tuple(quantize_embeddings(np.asarray(embedding, dtype=np.float32)).tolist())
+
+def _error_status(error: BaseException) -> Optional[int]:
+    """Return the HTTP status code carried by an API error, if it has one."""
+    for value in (getattr(error, "code", None), getattr(getattr(error, "response", None), "status_code", None)):
+        if isinstance(value, int):
+            return value
+    return None
+
+def _is_rate_limit_error(error: BaseException) -> bool:
+    """Check whether an embedding error means the API quota was exhausted (HTTP 429)."""
+    if ResourceExhausted is not None and isinstance(error, ResourceExhausted):
+        return True
+    status_code = _error_status(error)
+    if status_code is not None:
+        return status_code == 429
+    # langchain_google_genai wraps API errors without a status, so fall back to the message
+    return _RATE_LIMIT_MESSAGE.search(str(error)) is not None
+
+def _is_auth_error(error: BaseException) -> bool:
+    """Check whether an embedding error means the API key is missing, invalid, or not allowed (HTTP 401/403)."""
+    auth_errors = tuple(cls for cls in (Unauthenticated, PermissionDenied) if cls is not None)
+    if auth_errors and isinstance(error, auth_errors):
+        return True
+    if _error_status(error) in (401, 403):
+        return True
+    # Google rejects a bad API key with a 400, so check the message too
+    message = str(error)
+    return "API_KEY_INVALID" in message or "API key not valid" in message
+
+async def embed_texts(embeddings_client: GoogleGenerativeAIEmbeddings, texts: List[str]) -> List[Union[List[float], BaseException]]:
+    """
+    Embed texts in concurrent, rate-limited batches and return the embeddings in input order.
+    
+    A text that could not be embedded gets the error that failed it in place of an
+    embedding. Errors that would fail every text are raised instead.
+    """
+    batches = list(utils.iter_batches(texts, EMBED_BATCH_SIZE))
+    
+    async def _request(batch: List[str]) -> List[List[float]]:
+        if hasattr(embeddings_client, "aembed_documents"):
+            return await embeddings_client.aembed_documents(batch)
+        # Fall back to the sync client without blocking the event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, embeddings_client.embed_documents, batch)
+    
+    async def _embed(batch: List[str]) -> List[List[float]]:
+        # Rough token estimate: ~4 characters per token
+        estimated_tokens = sum(len(text) for text in batch) // 4
+        for attempt in range(EMBED_MAX_RETRIES + 1):
+            try:
+                async with embed_rate_limiter.acquire(tokens=estimated_tokens):
+                    return await _request(batch)
+            except Exception as e:
+                if attempt == EMBED_MAX_RETRIES or not _is_rate_limit_error(e):
+                    raise
+                delay = EMBED_RETRY_BASE_DELAY * 2 ** attempt
+                logger.warning(f"Embedding quota exhausted, retrying in {delay:.0f}s (attempt {attempt + 1}/{EMBED_MAX_RETRIES})")
+                await asyncio.sleep(delay)
+    
+    batch_results = await asyncio.gather(*(_embed(batch) for batch in batches), return_exceptions=True)
+    
+    embeddings = []
+    for batch_index, (batch, result) in enumerate(zip(batches, batch_results)):
+        if isinstance(result, BaseException):
+            # A batch that ran out of quota retries would only burn more quota text by text,
+            # and a rejected API key would fail every text the same way
+            if _is_rate_limit_error(result) or _is_auth_error(result):
+                raise result
+            # Retry the failed batch one text at a time
+            logger.warning(f"Embedding batch {batch_index} failed, retrying texts individually: {str(result)}")
+            retried = await asyncio.gather(*(_embed([text]) for text in batch), return_exceptions=True)
+            if all(isinstance(embedding, BaseException) for embedding in retried):
+                # Not a problem with particular texts; surface the error
+                raise retried[0]
+            result = []
+            for text_index, embedding in enumerate(retried):
+                if isinstance(embedding, BaseException):
+                    logger.warning(f"Skipping text {text_index} of embedding batch {batch_index}: {str(embedding)}")
+                    result.append(embedding)
+                else:
+                    result.append(embedding[0])
+        embeddings.extend(result)
+    
+    return embeddings
+
 async def process_file_chunks(file: UploadFile) -> List[Dict[str, Any]]:
     """Process file and return chunks with metadata."""
     try:
@@ -44,8 +218,22 @@ async def process_file_chunks(file: UploadFile) -> List[Dict[str, Any]]:
                 detail=f"File size ({file_size/1024/1024:.2f}MB) exceeds maximum allowed size of {MAX_FILE_SIZE/1024/1024}MB"
             )
         
-        # Process the file using our utility functions
-        chunks = utils.process_uploaded_file(file)
+        file_ext = await asyncio.to_thread(utils.detect_upload_extension, file)
+        
+        # Parse from memory; only legacy formats whose loaders need a path go through a temp file
+        temp_file_path = None
+        if file_ext in utils.PATH_ONLY_EXTENSIONS:
+            temp_file_path = await asyncio.to_thread(utils.save_upload_file, file, file_ext)
+            source = temp_file_path
+        else:
+            source = await file.read()
+        
+        try:
+            # Parse in the process pool so CPU-bound work doesn't block the event loop
+            loop = asyncio.get_running_loop()
+            chunks = await loop.run_in_executor(parse_pool, utils.process_uploaded_file, source, file_ext)
+        finally:
+            utils.delete_temp_file(temp_file_path)
         
         if not chunks:
             raise HTTPException(
@@ -53,8 +241,8 @@ async def process_file_chunks(file: UploadFile) -> List[Dict[str, Any]]:
                 detail="No valid content could be extracted from the file. Please check if the file format is supported."
             )
             
-        # Filter out any None or invalid chunks
-        valid_chunks = [chunk for chunk in chunks if chunk and hasattr(chunk, 'page_content') and chunk.page_content.strip()]
+        # Filter out whitespace-only chunks once; later steps can rely on this
+        valid_chunks = [chunk for chunk in chunks if chunk.page_content and not chunk.page_content.isspace()]
         
         if not valid_chunks:
             raise HTTPException(
@@ -73,6 +261,67 @@ async def process_file_chunks(file: UploadFile) -> List[Dict[str, Any]]:
             detail=f"An error occurred while processing the file: {str(e)}"
         )
 
+def _upsert_batch_size(vectors: List[tuple]) -> int:
+    """Pick a batch size that keeps every upsert request under the size limit."""
+    # Rough JSON size: ~20 bytes per float value plus the serialized metadata
+    largest_vector = max(len(values) * 20 + len(str(metadata)) for _, values, metadata in vectors)
+    return max(1, min(UPSERT_BATCH_SIZE, MAX_UPSERT_REQUEST_BYTES // largest_vector))
+
+async def upsert_vectors(vectors: List[tuple]) -> set:
+    """Upsert vectors to Pinecone in parallel batches and return the IDs that were stored."""
+    if not vectors:
+        return set()
+    
+    batches = list(utils.iter_batches(vectors, _upsert_batch_size(vectors)))
+    
+    # Fire all batches at once; the index's pool_threads run them in parallel
+    pending = []
+    for batch in batches:
+        try:
+            pending.append((batch, pinecone_index.upsert(vectors=batch, async_req=True)))
+        except Exception as e:
+            logger.error(f"Failed to submit batch of {len(batch)} chunks to Pinecone: {str(e)}")
+    
+    stored_ids = set()
+    for batch, async_result in pending:
+        try:
+            await asyncio.to_thread(async_result.get)
+            stored_ids.update(vector_id for vector_id, _, _ in batch)
+        except Exception as e:
+            logger.error(f"Failed to store batch of {len(batch)} chunks in Pinecone: {str(e)}")
+    
+    logger.info(f"Stored {len(stored_ids)}/{len(vectors)} vectors in {len(batches)} batch(es)")
+    return stored_ids
+
+def slide_from_metadata(vector_id: str, metadata: Dict[str, Any]) -> SlideInDB:
+    """Build a SlideInDB from trusted vector metadata without re-running validation."""
+    return SlideInDB.model_construct(
+        id=vector_id,
+        vector_id=vector_id,
+        **{
+            **metadata,
+            "created_at": datetime.fromisoformat(metadata["created_at"]),
+            "updated_at": datetime.fromisoformat(metadata["updated_at"]),
+        }
+    )
+
+async def fetch_existing_vectors(vector_ids: List[str]) -> Dict[str, Any]:
+    """Return the vectors already stored in Pinecone for the given IDs, keyed by ID."""
+    existing = {}
+    for batch in utils.iter_batches(dict.fromkeys(vector_ids), FETCH_BATCH_SIZE):
+        try:
+            response = await asyncio.to_thread(pinecone_index.fetch, ids=batch)
+            existing.update(response.vectors)
+        except Exception as e:
+            # Treat the batch as new content; it will just be embedded again
+            logger.warning(f"Failed to check {len(batch)} chunks for existing vectors: {str(e)}")
+    return existing
+
+def _stored_created_at(record: Any, default: str) -> str:
+    """Return the creation time of a stored vector, or the default for new content."""
+    metadata = getattr(record, "metadata", None) or {}
+    return metadata.get("created_at") or default
+
 async def upload_slide(slide_data: SlideCreate, file: UploadFile) -> List[SlideInDB]:
     """Upload a new slide with metadata and process its content."""
     try:
@@ -115,94 +364,107 @@ async def upload_slide(slide_data: SlideCreate, file: UploadFile) -> List[SlideI
                 detail="No valid content could be extracted from the file"
             )
         
-        # Initialize embeddings with explicit model and dimension
-        try:
-            doc_embeddings = GoogleGenerativeAIEmbeddings(
-                model="models/text-embedding-004",
-                task_type="retrieval_document",  # Use retrieval_document for document embeddings
-                google_api_key=os.getenv("GOOGLE_API_KEY")
+        # Content-addressed IDs: identical chunk text in the same slide and file always
+        # maps to the same vector, so re-uploads reuse it without taking over the
+        # vectors of other slides that share the text
+        chunk_ids = [
+            utils.generate_chunk_id(
+                chunk.page_content,
+                slide_data.course_name,
+                slide_data.subject_name,
+                slide_data.slide_name,
+                file.filename
             )
+            for chunk in chunks
+        ]
+        existing_vectors = await fetch_existing_vectors(chunk_ids)
+        
+        # Keep the first occurrence of each chunk; only those not already stored need embedding
+        seen_ids = set()
+        unique_indices = []
+        new_indices = []
+        for i, chunk_id in enumerate(chunk_ids):
+            if chunk_id in seen_ids:
+                continue
+            seen_ids.add(chunk_id)
+            unique_indices.append(i)
+            if not getattr(existing_vectors.get(chunk_id), "values", None):
+                new_indices.append(i)
+        logger.info(f"Found {len(unique_indices) - len(new_indices)} stored chunks, embedding {len(new_indices)} new chunks")
+        
+        # Embed new chunks in batches instead of one request per chunk
+        texts = [chunks[i].page_content for i in new_indices]
+        try:
+            embeddings = await embed_texts(doc_embeddings, texts)
+            logger.info(f"Generated {len(embeddings)} embeddings in batches of {EMBED_BATCH_SIZE}")
+            
+            # Skip chunks whose text could not be embedded
+            failures = {i: embedding for i, embedding in zip(new_indices, embeddings) if isinstance(embedding, BaseException)}
+            if failures:
+                if len(failures) == len(new_indices):
+                    # Nothing new was embedded; report why instead of storing nothing
+                    raise next(iter(failures.values()))
+                logger.warning(f"Skipping {len(failures)} chunks that could not be embedded")
+                unique_indices = [i for i in unique_indices if i not in failures]
+                new_indices = [i for i in new_indices if i not in failures]
+                embeddings = [embedding for embedding in embeddings if not isinstance(embedding, BaseException)]
             
-            # Verify the embedding dimension
-            test_embedding = doc_embeddings.embed_documents(["test"])[0]
-            embedding_dimension = len(test_embedding)
+            # Keep embeddings as one contiguous float32 matrix for the upsert
+            embedding_matrix = np.asarray(embeddings, dtype=np.float32)
             
-            if embedding_dimension != 768:  # Expected dimension for text-embedding-004
-                error_msg = f"Unexpected embedding dimension: {embedding_dimension}. Expected 768."
+            # Verify the embedding dimension matches the index
+            if len(embedding_matrix) and embedding_matrix.shape[1] != EMBEDDING_DIMENSION:
+                error_msg = f"Unexpected embedding dimension: {embedding_matrix.shape[1]}. Expected {EMBEDDING_DIMENSION}."
                 logger.error(error_msg)
                 raise ValueError(error_msg)
-                
+            
+            embedding_matrix = quantize_embeddings(embedding_matrix)
         except Exception as e:
-            logger.error(f"Failed to initialize embeddings: {str(e)}", exc_info=True)
+            logger.error(f"Failed to generate embeddings: {str(e)}", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Failed to initialize text embeddings: {str(e)}"
+                detail=f"Failed to generate embeddings: {str(e)}"
             )
         
-        # Process each chunk
-        results = []
+        # Build the chunks as parallel lists of IDs, embeddings, and metadata;
+        # stored chunks reuse their vectors but take this upload's metadata
         total_chunks = len(chunks)
+        file_name = file.filename
+        content_type = file.content_type or "application/octet-stream"
+        description = slide_data.description or ''
         
-        for i, chunk in enumerate(chunks):
-            try:
-                if not chunk or not hasattr(chunk, 'page_content') or not chunk.page_content.strip():
-                    logger.warning(f"Skipping empty or invalid chunk {i}")
-                    continue
-                    
-                # Generate a unique ID for this chunk
-                chunk_id = f"{utils.generate_slide_id()}_{i}"
-                
-                # Get embedding for the chunk
-                try:
-                    embedding = doc_embeddings.embed_documents([chunk.page_content])[0]
-                except Exception as e:
-                    logger.error(f"Failed to generate embedding for chunk {i}: {str(e)}")
-                    continue
-                
-                # Generate timestamps
-                current_time = datetime.utcnow().isoformat()
-                
-                # Generate metadata (excluding 'id' as it will be passed separately)
-                metadata = {
-                    "slide_name": f"{slide_data.slide_name} (Part {i+1})",
-                    "course_name": slide_data.course_name,
-                    "subject_name": slide_data.subject_name,
-                    "description": f"{slide_data.description or ''} [Part {i+1} of {total_chunks}]",
-                    "created_at": current_time,
-                    "updated_at": current_time,
-                    "file_name": file.filename,
-                    "content_type": file.content_type or "application/octet-stream",
-                    "chunk_index": i,
-                    "total_chunks": total_chunks
-                }
-                
-                # Store in Pinecone
-                try:
-                    pinecone_index.upsert(
-                        vectors=[(
-                            chunk_id,
-                            embedding,
-                            metadata
-                        )]
-                    )
-                    
-                    # Create SlideInDB object
-                    slide = SlideInDB(
-                        id=chunk_id,
-                        **metadata,
-                        vector_id=chunk_id,
-                        embedding=embedding
-                    )
-                    results.append(slide)
-                    logger.info(f"Successfully processed chunk {i+1}/{total_chunks}")
-                    
-                except Exception as e:
-                    logger.error(f"Failed to store chunk {i} in Pinecone: {str(e)}")
-                    continue
-                
-            except Exception as e:
-                logger.error(f"Unexpected error processing chunk {i}: {str(e)}", exc_info=True)
-                continue
+        # All chunks of one upload share the same timestamps
+        current_time = utils.utc_timestamp()
+        
+        new_embeddings = dict(zip(new_indices, embedding_matrix))
+        ids = [chunk_ids[i] for i in unique_indices]
+        embedding_rows = [
+            new_embeddings[i] if i in new_embeddings else existing_vectors[chunk_ids[i]].values
+            for i in unique_indices
+        ]
+        metadatas = [
+            {
+                "slide_name": f"{slide_data.slide_name} (Part {i+1})",
+                "course_name": slide_data.course_name,
+                "subject_name": slide_data.subject_name,
+                "description": f"{description} [Part {i+1} of {total_chunks}]",
+                "created_at": _stored_created_at(existing_vectors.get(chunk_ids[i]), current_time),
+                "updated_at": current_time,
+                "file_name": file_name,
+                "content_type": content_type,
+                "chunk_index": i,
+                "total_chunks": total_chunks
+            }
+            for i in unique_indices
+        ]
+        
+        # Store all vectors in Pinecone with batched, parallel upserts
+        stored_ids = await upsert_vectors(list(zip(ids, embedding_rows, metadatas)))
+        results = [
+            slide_from_metadata(vector_id, metadata)
+            for vector_id, metadata in zip(ids, metadatas)
+            if vector_id in stored_ids
+        ]
                 
         if not results:
             raise HTTPException(
@@ -251,14 +513,8 @@ def search_slides(query: str, limit: int = 5) -> List[SlideInDB]:
     """Search slides by semantic similarity to the query."""
     try:
         try:
-            # Initialize query embeddings with the appropriate task type
-            query_embeddings = GoogleGenerativeAIEmbeddings(
-                model="models/text-embedding-004",
-                task_type="retrieval_query"  # Use retrieval_query for search queries
-            )
-            
-            # Get embedding for the query
-            query_embedding = query_embeddings.embed_query(query)
+            # Get embedding for the query; repeated queries skip the API call
+            query_embedding = list(_embed_query(query))
         except Exception as e:
             logger.error(f"Failed to generate query embedding: {str(e)}")
             raise HTTPException(
@@ -276,13 +532,7 @@ def search_slides(query: str, limit: int = 5) -> List[SlideInDB]:
         # Convert results to SlideInDB objects
         slides = []
         for match in results.matches:
-            metadata = match.metadata
-            slides.append(SlideInDB(
-                id=match.id,
-                vector_id=match.id,
-                embedding=match.values,
-                **metadata
-            ))
+            slides.append(slide_from_metadata(match.id, match.metadata))
             
         return slides
         
@@ -1,5 +1,6 @@
 import os
 import logging
+import threading
 from pinecone import Pinecone, ServerlessSpec
 from dotenv import load_dotenv
 from typing import Optional
@@ -15,10 +16,16 @@ load_dotenv()
 _pinecone_client = None
 _pinecone_index = None
 
-def init_db() -> bool:
+# Serializes index initialization so concurrent callers don't race create_index
+_index_lock = threading.Lock()
+
+def init_db(verify: bool = True) -> bool:
     """
     Initialize the database connection.
     
+    Args:
+        verify: Whether to check the connection by listing indexes
+    
     Returns:
         bool: True if initialization was successful, False otherwise
     """
@@ -36,6 +43,9 @@ def init_db() -> bool:
         logger.info("Initializing Pinecone connection...")
         _pinecone_client = Pinecone(api_key=api_key)
         
+        if not verify:
+            return True
+        
         # Verify connection by listing indexes
         try:
             _pinecone_client.list_indexes()
@@ -53,10 +63,16 @@ def init_db() -> bool:
 # Dimension for the embedding model (Google's text-embedding-004 uses 768 dimensions)
 EMBEDDING_DIMENSION = 768
 
+# Number of threads the index uses to run async_req upserts in parallel
+PINECONE_POOL_THREADS = int(os.getenv("PINECONE_POOL_THREADS", "30"))
+
 def get_pinecone_index():
     """
     Get or create a Pinecone index with the correct dimension for the embedding model.
     
+    The index is resolved once per process; later calls return the cached handle
+    without any control-plane requests.
+    
     Returns:
         pinecone.Index: The Pinecone index object
         
@@ -67,79 +83,56 @@ def get_pinecone_index():
     
     if _pinecone_index is not None:
         return _pinecone_index
-        
-    # Initialize Pinecone if not already done
-    if _pinecone_client is None and not init_db():
-        raise RuntimeError("Failed to initialize database connection")
     
-    index_name = os.getenv("PINECONE_INDEX", "reassesment")
-    
-    try:
-        existing_indexes = _pinecone_client.list_indexes()
-        index_exists = any(index.name == index_name for index in existing_indexes)
+    with _index_lock:
+        # Another thread may have finished initialization while we waited
+        if _pinecone_index is not None:
+            return _pinecone_index
+            
+        # Initialize Pinecone if not already done; listing indexes below verifies the connection
+        if _pinecone_client is None and not init_db(verify=False):
+            raise RuntimeError("Failed to initialize database connection")
+        
+        index_name = os.getenv("PINECONE_INDEX", "reassesment")
         
-        if index_exists:
-            # Get the existing index
-            _pinecone_index = _pinecone_client.Index(index_name)
-            logger.info(f"Using existing Pinecone index: {index_name}")
+        try:
+            # The index list already carries each index's dimension
+            existing_index = next(
+                (index for index in _pinecone_client.list_indexes() if index.name == index_name),
+                None
+            )
             
-            # Verify the index has the correct dimension
-            try:
-                index_stats = _pinecone_index.describe_index_stats()
-                index_dimension = index_stats.dimension
-                
-                if index_dimension != EMBEDDING_DIMENSION:
-                    logger.warning(f"Deleting existing index with dimension {index_dimension} to create new one with dimension {EMBEDDING_DIMENSION}")
-                    _pinecone_client.delete_index(index_name)
-                    index_exists = False
-                    logger.info(f"Deleted index {index_name}")
-                    
-            except Exception as e:
-                logger.warning(f"Could not verify index dimension: {str(e)}")
-                logger.warning("Will attempt to create a new index")
-                
-        else:
-            # Create a new index with the correct dimension
-            logger.info(f"Creating new Pinecone index: {index_name} with dimension {EMBEDDING_DIMENSION}")
-            try:
-                # Try with AWS us-east-1 first (free tier supported)
+            if existing_index is not None and existing_index.dimension != EMBEDDING_DIMENSION:
+                logger.warning(f"Deleting existing index with dimension {existing_index.dimension} to create new one with dimension {EMBEDDING_DIMENSION}")
+                _pinecone_client.delete_index(index_name)
+                logger.info(f"Deleted index {index_name}")
+                existing_index = None
+            
+            if existing_index is not None:
+                logger.info(f"Using existing Pinecone index: {index_name}")
+            else:
+                # Create a new index with the correct dimension
+                cloud = os.getenv("PINECONE_CLOUD", "aws")
+                region = os.getenv("PINECONE_REGION", "us-east-1")  # Free tier supported region
+                logger.info(f"Creating new Pinecone index: {index_name} with dimension {EMBEDDING_DIMENSION} in {cloud} {region}")
                 try:
                     _pinecone_client.create_index(
                         name=index_name,
                         dimension=EMBEDDING_DIMENSION,
                         metric="cosine",
-                        spec=ServerlessSpec(
-                            cloud='aws',
-                            region='us-east-1'  # Free tier supported region
-                        )
+                        spec=ServerlessSpec(cloud=cloud, region=region)
                     )
-                    logger.info("Successfully created index in AWS us-east-1")
-                except Exception as aws_error:
-                    logger.warning(f"Failed to create index in AWS us-east-1: {str(aws_error)}")
-                    logger.info("Trying GCP us-central1...")
-                    # Fall back to GCP if AWS fails
-                    _pinecone_client.create_index(
-                        name=index_name,
-                        dimension=EMBEDDING_DIMENSION,
-                        metric="cosine",
-                        spec=ServerlessSpec(
-                            cloud='gcp',
-                            region='us-central1'  # Common GCP region
-                        )
-                    )
-                    logger.info("Successfully created index in GCP us-central1")
-                
-                _pinecone_index = _pinecone_client.Index(index_name)
-                logger.info(f"Successfully created Pinecone index: {index_name}")
-                
-            except Exception as create_error:
-                error_msg = f"Failed to create Pinecone index: {str(create_error)}"
-                logger.error(error_msg, exc_info=True)
-                raise RuntimeError(error_msg) from create_error
-        
-        return _pinecone_index
-        
-    except Exception as e:
-        error_msg = f"Failed to get Pinecone index: {str(e)}"
-        logger.error(error_msg, exc_info=True)
-        raise RuntimeError(error_msg) from e
+                    logger.info(f"Successfully created Pinecone index: {index_name}")
+                    
+                except Exception as create_error:
+                    error_msg = f"Failed to create Pinecone index: {str(create_error)}"
+                    logger.error(error_msg, exc_info=True)
+                    raise RuntimeError(error_msg) from create_error
+            
+            _pinecone_index = _pinecone_client.Index(index_name, pool_threads=PINECONE_POOL_THREADS)
+            return _pinecone_index
+            
+        except Exception as e:
+            error_msg = f"Failed to get Pinecone index: {str(e)}"
+            logger.error(error_msg, exc_info=True)
+            raise RuntimeError(error_msg) from e
@@ -1,10 +1,48 @@
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 # Import router
 from .routers import slides as slides_router
+from .controllers import slide_controller
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+def start_parse_pool():
+    """Start the process pool used to parse uploaded files, if the platform supports one."""
+    # Spawn rather than fork: the server process already runs client threads
+    try:
+        slide_controller.parse_pool = ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    except (OSError, NotImplementedError, PermissionError) as e:
+        # Serverless runtimes such as AWS Lambda have no /dev/shm for process locks;
+        # parsing then runs in the default thread pool
+        logger.warning(f"Could not start the file parsing process pool, parsing in threads: {str(e)}")
+        slide_controller.parse_pool = None
+
+def stop_parse_pool():
+    """Shut down the file parsing process pool."""
+    if slide_controller.parse_pool is not None:
+        slide_controller.parse_pool.shutdown(cancel_futures=True)
+        slide_controller.parse_pool = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the file parsing process pool for the lifetime of the app."""
+    start_parse_pool()
+    try:
+        yield
+    finally:
+        stop_parse_pool()
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -0,0 +1,66 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+class RateLimiter:
+    """
+    Limit concurrency, requests per minute, and tokens per minute for an API.
+
+    Request and token budgets are token buckets that refill continuously, so a
+    burst can use up to a full minute's allowance and then waits for the refill.
+    One instance should be shared by every caller of the same API.
+    """
+
+    def __init__(self, max_concurrency: int, requests_per_minute: int, tokens_per_minute: int):
+        if max_concurrency < 1 or requests_per_minute < 1 or tokens_per_minute < 1:
+            raise ValueError("Rate limits must be at least 1")
+
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._lock = asyncio.Lock()
+        self._request_allowance = float(requests_per_minute)
+        self._token_allowance = float(tokens_per_minute)
+        self._last_refill = time.monotonic()
+
+    def _refill(self) -> None:
+        """Add the allowance earned since the last refill, capped at one minute's worth."""
+        now = time.monotonic()
+        elapsed_minutes = (now - self._last_refill) / 60
+        self._last_refill = now
+        self._request_allowance = min(
+            self.requests_per_minute,
+            self._request_allowance + elapsed_minutes * self.requests_per_minute
+        )
+        self._token_allowance = min(
+            self.tokens_per_minute,
+            self._token_allowance + elapsed_minutes * self.tokens_per_minute
+        )
+
+    async def _reserve(self, tokens: int) -> None:
+        """Wait until one request and the given number of tokens are available, then take them."""
+        # A single request larger than the whole budget still has to go through eventually
+        tokens = min(tokens, self.tokens_per_minute)
+
+        # Holding the lock while sleeping makes waiters proceed in arrival order
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._request_allowance >= 1 and self._token_allowance >= tokens:
+                    self._request_allowance -= 1
+                    self._token_allowance -= tokens
+                    return
+
+                wait_minutes = max(
+                    (1 - self._request_allowance) / self.requests_per_minute,
+                    (tokens - self._token_allowance) / self.tokens_per_minute
+                )
+                await asyncio.sleep(wait_minutes * 60)
+
+    @asynccontextmanager
+    async def acquire(self, tokens: int = 0) -> AsyncIterator[None]:
+        """Hold a concurrency slot and charge one request plus `tokens` against the budget."""
+        async with self._semaphore:
+            await self._reserve(tokens)
+            yield
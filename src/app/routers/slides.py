@@ -23,27 +23,18 @@ async def upload_slide(
     Returns a list of SlideInDB objects, one for each chunk of the processed file.
     """
     try:
-        # Read file content and create slide data
-        file_content = await file.read()
-        
+        # Create slide data; the controller streams the file content itself
         slide_data = SlideCreate(
             slide_name=slide_name,
             course_name=course_name,
             subject_name=subject_name,
             description=description,
-            file_content=file_content,
             file_name=file.filename,
             content_type=file.content_type
         )
         
-        # Reset file pointer for the controller to read it again
-        await file.seek(0)
-        
         # Process the file and return the list of slides
-        slides = await slide_controller.upload_slide(slide_data, file)
-        
-        # Convert Pydantic models to dict to ensure proper serialization
-        return [slide.dict() for slide in slides]
+        return await slide_controller.upload_slide(slide_data, file)
         
     except HTTPException:
         raise
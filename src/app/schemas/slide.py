@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Annotated, Optional, List
 from datetime import datetime
 
 class SlideBase(BaseModel):
@@ -9,20 +9,19 @@ class SlideBase(BaseModel):
     description: Optional[str] = None
 
 class SlideCreate(SlideBase):
-    file_content: bytes
     file_name: str
     content_type: str
 
 class Slide(SlideBase):
+    model_config = ConfigDict(from_attributes=True)
+    
     id: str
     created_at: datetime
     updated_at: datetime
     file_name: str
     content_type: str
-    
-    class Config:
-        from_attributes = True
 
 class SlideInDB(Slide):
     vector_id: str
-    embedding: List[float]
+    # Raw vectors stay in Pinecone; they are never serialized in API responses
+    embedding: Annotated[Optional[List[float]], Field(exclude=True, repr=False)] = None
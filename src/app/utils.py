@@ -1,26 +1,27 @@
 import os
-import sys
+import shutil
 import uuid
+import hashlib
+import codecs
+import zipfile
 import tempfile 
 import io
+import re
+import time
 import logging
-from datetime import datetime
-from typing import List, Optional, Dict, Any, Union
-from pathlib import Path
-import pypdf
-import docx2python
-from pptx import Presentation
-from openpyxl import load_workbook
-
-# Handle magic import for Windows vs other OS
-if sys.platform == 'win32':
-    import magic  # This will use python-magic-bin on Windows
-else:
-    import magic  # This will use python-magic on other platforms
-
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import islice
+from typing import TYPE_CHECKING, List, Optional, Any, Union, Iterable, Iterator, BinaryIO
+import pymupdf
+import puremagic
+
 from langchain.schema import Document
 
+if TYPE_CHECKING:
+    import tiktoken
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -36,141 +37,431 @@ SUPPORTED_FILE_TYPES = {
     'text/plain': '.txt'
 }
 
+# Built once so extension checks are a set lookup rather than a scan of the dict values
+SUPPORTED_EXTENSIONS = frozenset(SUPPORTED_FILE_TYPES.values())
+
+# Legacy binary formats whose loaders need a file path instead of a stream
+PATH_ONLY_EXTENSIONS = {'.doc', '.ppt', '.xls'}
+
+# Temp files for those formats go to RAM-backed tmpfs when the host has one
+_SHM_DIR = "/dev/shm"
+_TMP_DIR = os.getenv("UPLOAD_TMP_DIR") or (
+    _SHM_DIR if os.path.isdir(_SHM_DIR) and os.access(_SHM_DIR, os.W_OK) else None
+)
+
+# Chunk sizes are measured in cl100k_base tokens
+DEFAULT_CHUNK_SIZE = 512
+DEFAULT_CHUNK_OVERLAP = 64
+
+# Number of recently measured text pieces whose token counts are kept
+TOKEN_LENGTH_CACHE_SIZE = 8192
+
+# Separators chunks are preferably cut at, and how strongly each is preferred
+_BREAK_PATTERN = re.compile(r"\n\n|\n| ")
+_BREAK_PRIORITY = {"\n\n": 3, "\n": 2, " ": 1}
+
+# Number of leading bytes used to sniff the MIME type of an upload
+MIME_SNIFF_BYTES = 4096
+
+# Leading-byte signatures of the supported binary formats
+_PDF_SIGNATURE = b'%PDF'
+_ZIP_SIGNATURE = b'PK\x03\x04'
+_OLE_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+# OOXML files are zips whose main part lives in a format-specific folder
+_OOXML_FOLDERS = {'word/': '.docx', 'ppt/': '.pptx', 'xl/': '.xlsx'}
+
+# Legacy Office files are OLE containers named by their main stream
+_OLE_STREAMS = {'WordDocument': '.doc', 'PowerPoint Document': '.ppt', 'Workbook': '.xls'}
+
+def _is_text(head: bytes) -> bool:
+    """Check whether leading bytes look like UTF-8 text."""
+    if not head or b'\x00' in head:
+        return False
+    try:
+        # Incremental decoding tolerates a character cut off at the end of the buffer
+        codecs.getincrementaldecoder('utf-8')().decode(head)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+def _sniff_extension(head: bytes) -> Optional[str]:
+    """Detect a supported file extension from a file's leading bytes."""
+    if head.startswith(_PDF_SIGNATURE):
+        return '.pdf'
+    if head.startswith(_ZIP_SIGNATURE):
+        # Local file headers store entry names uncompressed
+        return next((ext for folder, ext in _OOXML_FOLDERS.items() if folder.encode() in head), None)
+    if head.startswith(_OLE_SIGNATURE):
+        return next((ext for stream, ext in _OLE_STREAMS.items() if stream.encode('utf-16-le') in head), None)
+    if _is_text(head):
+        return '.txt'
+    return None
+
 def get_file_extension(file_path: str) -> Optional[str]:
-    """Get file extension based on MIME type."""
-    mime = magic.Magic(mime=True)
-    file_mime = mime.from_file(file_path)
-    return SUPPORTED_FILE_TYPES.get(file_mime)
+    """Get file extension based on the file's signature."""
+    with open(file_path, 'rb') as f:
+        head = f.read(MIME_SNIFF_BYTES)
+    
+    if head.startswith(_ZIP_SIGNATURE):
+        # Peek the central directory for the main part's folder
+        try:
+            with zipfile.ZipFile(file_path) as zf:
+                names = zf.namelist()
+            return next((ext for name in names for folder, ext in _OOXML_FOLDERS.items() if name.startswith(folder)), None)
+        except zipfile.BadZipFile:
+            return None
+    
+    # The header is all the sniffers need, so the rest of the file is never read
+    return get_buffer_extension(head)
+
+def get_buffer_extension(buffer: bytes) -> Optional[str]:
+    """Get file extension based on the signature in the file's leading bytes."""
+    file_ext = _sniff_extension(buffer)
+    if file_ext:
+        return file_ext
+    
+    try:
+        return SUPPORTED_FILE_TYPES.get(puremagic.from_string(buffer, mime=True))
+    except puremagic.PureError:
+        return None
 
 def save_upload_file(upload_file, suffix: str = "") -> str:
     """Save uploaded file to a temporary file and return its path."""
     try:
         suffix = "." + suffix.lstrip(".") if suffix else ""
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            tmp.write(upload_file.file.read())
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=_TMP_DIR) as tmp:
+            # Stream in 1MB chunks instead of reading the whole file into memory
+            shutil.copyfileobj(upload_file.file, tmp, length=1024 * 1024)
             return tmp.name
     except Exception as e:   
         logger.error(f"Error saving uploaded file: {str(e)}")
         raise 
 
-def load_document(file_path: str) -> List[Document]:
-    """Load document using appropriate loader based on file type."""
+def _extract_pdf_pages_pdfium(pdf_bytes: bytes) -> List[str]:
+    """Extract the text of every page with PDFium, for PDFs MuPDF cannot open."""
+    import pypdfium2 as pdfium
+    
+    pdf = pdfium.PdfDocument(pdf_bytes)
     try:
-        file_ext = get_file_extension(file_path)
-        
-        if not file_ext: 
-            # Try to get the extension from the filename as a fallback
-            file_ext = os.path.splitext(file_path)[1].lower()
-            if not file_ext or file_ext not in ['.pdf', '.docx', '.doc', '.pptx', '.ppt', '.xlsx', '.xls', '.txt']:
-                raise ValueError(f"Unsupported file type: {file_path}. Supported types: {', '.join(SUPPORTED_FILE_TYPES.values())}")
+        page_texts = []
+        for page in pdf:
+            text_page = page.get_textpage()
+            page_texts.append(text_page.get_text_range())
+            text_page.close()
+            page.close()
+        return page_texts
+    finally:
+        pdf.close()
+
+def iter_pdf_pages(pdf_bytes: bytes) -> Iterator[str]:
+    """Yield the text of each page of a PDF in order."""
+    try:
+        pdf = pymupdf.open(stream=pdf_bytes, filetype="pdf")
+    except Exception as e:
+        logger.warning(f"MuPDF could not open PDF, falling back to PDFium: {str(e)}")
+        yield from _extract_pdf_pages_pdfium(pdf_bytes)
+        return
+    
+    with pdf:
+        for page in pdf:
+            yield page.get_text("text")
+
+def extract_pdf_pages(pdf_bytes: bytes) -> List[str]:
+    """Extract the text of every page of a PDF."""
+    return list(iter_pdf_pages(pdf_bytes))
+
+def _sniff_source_extension(source: Union[str, BinaryIO]) -> Optional[str]:
+    """Detect the extension of a file path or of a binary stream without consuming it."""
+    if isinstance(source, str):
+        return get_file_extension(source)
+    file_ext = get_buffer_extension(source.read(MIME_SNIFF_BYTES))
+    source.seek(0)
+    return file_ext
+
+def iter_documents(source: Union[str, BinaryIO], known_ext: Optional[str] = None) -> Iterator[Document]:
+    """
+    Load a document using the appropriate loader for its file type, yielding it in parts.
+    
+    PDFs are yielded page by page and presentations slide by slide, as they are read.
+    The source may be a file path or a binary stream positioned at the start of the file.
+    The file is only sniffed when the caller does not already know its extension.
+    """
+    is_path = isinstance(source, str)
+    source_name = source if is_path else getattr(source, 'name', '<upload>')
+    try:
+        file_ext = (
+            (known_ext or "").lower()
+            or _sniff_source_extension(source)
+            or os.path.splitext(source_name)[1].lower()
+        )
+        if file_ext not in SUPPORTED_EXTENSIONS:
+            raise ValueError(f"Unsupported file type: {source_name}. Supported types: {', '.join(SUPPORTED_FILE_TYPES.values())}")
         
         logger.info(f"Loading document with extension: {file_ext}")
         
         if file_ext == '.pdf':
-            # Load PDF using pypdf
-            reader = pypdf.PdfReader(file_path)
-            text = "\n\n".join([page.extract_text() for page in reader.pages if page.extract_text()])
-            return [Document(page_content=text, metadata={"source": file_path})]
+            # Load PDF using PyMuPDF (MuPDF C backend)
+            if is_path:
+                with open(source, 'rb') as f:
+                    pdf_bytes = f.read()
+            else:
+                pdf_bytes = source.read()
+            # One Document per page so the pages are never concatenated just to be split again
+            for page_number, page_text in enumerate(iter_pdf_pages(pdf_bytes)):
+                if page_text:
+                    yield Document(page_content=page_text, metadata={"source": source_name, "page": page_number})
             
         elif file_ext in ['.docx', '.doc']:
-            # Load DOCX using docx2python
-            doc = docx2python.docx2python(file_path)
+            # Load DOCX using docx2python; loaders are imported on first use of their format
+            import docx2python
+            doc = docx2python.docx2python(source)
             text = doc.text
-            return [Document(page_content=text, metadata={"source": file_path})]
+            yield Document(page_content=text, metadata={"source": source_name})
             
         elif file_ext in ['.pptx', '.ppt']:
             # Load PPTX using python-pptx
-            prs = Presentation(file_path)
-            text = ""
-            for slide in prs.slides:
+            from pptx import Presentation
+            prs = Presentation(source)
+            # One Document per slide, like PDF pages
+            for slide_number, slide in enumerate(prs.slides):
+                parts = []
                 for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        text += shape.text + "\n"
-            return [Document(page_content=text, metadata={"source": file_path})]
+                    shape_text = getattr(shape, "text", None)
+                    if shape_text:
+                        parts.append(shape_text)
+                        parts.append("\n")
+                if parts:
+                    yield Document(
+                        page_content="".join(parts),
+                        metadata={"source": source_name, "slide": slide_number}
+                    )
             
         elif file_ext in ['.xlsx', '.xls']:
             # Load XLSX using openpyxl
-            wb = load_workbook(file_path, read_only=True, data_only=True)
-            text = ""
+            from openpyxl import load_workbook
+            wb = load_workbook(source, read_only=True, data_only=True)
+            parts = []
             for sheet_name in wb.sheetnames:
                 sheet = wb[sheet_name]
                 for row in sheet.iter_rows(values_only=True):
-                    text += " ".join(str(cell) for cell in row if cell is not None) + "\n"
-            return [Document(page_content=text, metadata={"source": file_path})]
+                    line = " ".join(str(cell) for cell in row if cell is not None)
+                    # Blank rows would only add empty lines to the chunks
+                    if line:
+                        parts.append(line)
+                        parts.append("\n")
+            text = "".join(parts)
+            yield Document(page_content=text, metadata={"source": source_name})
             
         else:
             # For .txt files or any other text files
-            with open(file_path, 'r', encoding='utf-8') as f:
-                text = f.read()
-            return [Document(page_content=text, metadata={"source": file_path})]
+            if is_path:
+                with open(source, 'r', encoding='utf-8') as f:
+                    text = f.read()
+            else:
+                text = source.read().decode('utf-8')
+            yield Document(page_content=text, metadata={"source": source_name})
             
     except Exception as e:
-        logger.error(f"Error loading document {os.path.basename(file_path)}: {str(e)}", exc_info=True)
+        logger.error(f"Error loading document {os.path.basename(source_name)}: {str(e)}", exc_info=True)
         raise
 
-def chunk_documents(documents: List[Document], 
-                   chunk_size: int = 1000, 
-                   chunk_overlap: int = 200) -> List[Document]:
-    """Split documents into chunks."""
-    text_splitter = RecursiveCharacterTextSplitter(
+def load_document(source: Union[str, BinaryIO], known_ext: Optional[str] = None) -> List[Document]:
+    """Load a document using the appropriate loader for its file type."""
+    return list(iter_documents(source, known_ext))
+
+@lru_cache(maxsize=1)
+def _get_token_encoding() -> "tiktoken.Encoding":
+    """Get the tokenizer shared by every splitter, loading it on first use."""
+    # Loading the BPE ranks may download them, so it is left out of import time
+    import tiktoken
+    return tiktoken.get_encoding("cl100k_base")
+
+# The splitter measures the same pieces repeatedly while recursing and merging;
+# str caches its own hash, so repeat lookups skip tokenization entirely
+@lru_cache(maxsize=TOKEN_LENGTH_CACHE_SIZE)
+def _token_length(text: str) -> int:
+    """Count tokens in text with the shared tiktoken encoding."""
+    return len(_get_token_encoding().encode(text, disallowed_special=()))
+
+@lru_cache(maxsize=16)
+def _get_splitter(chunk_size: int, chunk_overlap: int) -> "RecursiveCharacterTextSplitter":
+    """Get a text splitter that measures chunk sizes in tokens, cached per configuration."""
+    # Only needed when fast_recursive_split falls back, so imported on first use
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
-        length_function=len,
+        length_function=_token_length,
     )
-    return text_splitter.split_documents(documents)
 
-def process_uploaded_file(upload_file, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Document]:
-    """Process an uploaded file: save, load, and chunk it."""
-    temp_file_path = None
-    try:
-        if not upload_file or upload_file.filename == '':
-            raise ValueError("No file was uploaded")
-            
-        logger.info(f"Processing uploaded file: {upload_file.filename} (size: {upload_file.size} bytes)")
+def fast_recursive_split(text: str, 
+                         chunk_size: int = DEFAULT_CHUNK_SIZE, 
+                         chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+                         tokens: Optional[List[int]] = None) -> List[str]:
+    """
+    Split text into chunks of at most chunk_size tokens in a single pass.
+    
+    Like the recursive splitter, cuts prefer a paragraph break, then a line break,
+    then a space, but the text is tokenized and scanned for separators only once.
+    Callers that already hold the text's tokens can pass them to skip tokenizing.
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError(f"Chunk overlap ({chunk_overlap}) must be smaller than chunk size ({chunk_size})")
+    
+    encoding = _get_token_encoding()
+    if tokens is None:
+        tokens = encoding.encode(text, disallowed_special=())
+    token_count = len(tokens)
+    if token_count <= chunk_size:
+        text = text.strip()
+        return [text] if text else []
+    
+    decoded, offsets = encoding.decode_with_offsets(tokens)
+    if decoded != text:
+        # Token offsets would not line up with the text
+        return _get_splitter(chunk_size, chunk_overlap).split_text(text)
+    
+    # How strongly a cut before each token is preferred; 0 where no separator starts
+    token_at = {offset: index for index, offset in enumerate(offsets)}
+    priority = [0] * (token_count + 1)
+    for match in _BREAK_PATTERN.finditer(text):
+        index = token_at.get(match.start())
+        if index is not None:
+            priority[index] = max(priority[index], _BREAK_PRIORITY[match.group()])
+    offsets.append(len(text))
+    
+    chunks = []
+    min_chunk_tokens = max(chunk_size // 2, 1)
+    start = 0
+    while start < token_count:
+        end = min(start + chunk_size, token_count)
+        if end < token_count:
+            # Cut at the latest of the strongest breaks in the back half of the window
+            end = max(range(start + min_chunk_tokens, end + 1), key=lambda index: (priority[index], index))
         
-        # Save the uploaded file temporarily with its original extension
-        file_ext = os.path.splitext(upload_file.filename)[1]
-        temp_file_path = save_upload_file(upload_file, suffix=file_ext)
+        chunk = text[offsets[start]:offsets[end]].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end == token_count:
+            break
         
+        # Overlap by up to chunk_overlap tokens, starting on a break where there is one,
+        # but always advance by chunk_size - chunk_overlap so short chunks cannot stall
+        overlap_start = min(max(end - chunk_overlap, start + chunk_size - chunk_overlap), end)
+        start = next((index for index in range(overlap_start, end) if priority[index]), overlap_start)
+    return chunks
+
+def chunk_documents(documents: Iterable[Document], 
+                   chunk_size: int = DEFAULT_CHUNK_SIZE, 
+                   chunk_overlap: int = DEFAULT_CHUNK_OVERLAP) -> List[Document]:
+    """
+    Split documents into chunks of at most chunk_size tokens as they arrive.
+    
+    Consecutive small documents, such as PDF pages or slides, are packed together
+    up to chunk_size tokens, so short pages do not each become a tiny chunk. Each
+    chunk keeps the metadata of the first document packed into it. Every document
+    is tokenized once; the splitter reuses those tokens.
+    """
+    encoding = _get_token_encoding()
+    separator = "\n\n"
+    separator_tokens = encoding.encode(separator, disallowed_special=())
+    chunks = []
+    pending: List[Document] = []
+    pending_tokens: List[int] = []
+    
+    def flush() -> None:
+        text = separator.join(document.page_content for document in pending)
+        for piece in fast_recursive_split(text, chunk_size, chunk_overlap, pending_tokens):
+            chunks.append(Document(page_content=piece, metadata=dict(pending[0].metadata)))
+    
+    for document in documents:
+        tokens = encoding.encode(document.page_content, disallowed_special=())
+        if pending and len(pending_tokens) + len(separator_tokens) + len(tokens) > chunk_size:
+            flush()
+            pending, pending_tokens = [], []
+        if pending:
+            # Joined documents decode to the joined text, so the splitter's offsets still line up
+            pending_tokens.extend(separator_tokens)
+        pending_tokens.extend(tokens)
+        pending.append(document)
+    if pending:
+        flush()
+    return chunks
+
+def detect_upload_extension(upload_file) -> Optional[str]:
+    """Get an upload's file extension from its filename, sniffing its leading bytes if that is unknown."""
+    if not upload_file or upload_file.filename == '':
+        raise ValueError("No file was uploaded")
+        
+    logger.info(f"Processing uploaded file: {upload_file.filename} (size: {upload_file.size} bytes)")
+    
+    # A supported extension in the filename makes sniffing unnecessary
+    file_ext = os.path.splitext(upload_file.filename)[1].lower()
+    if file_ext in SUPPORTED_EXTENSIONS:
+        return file_ext
+    
+    # Sniff the file type from the upload's first bytes without consuming the stream
+    head = upload_file.file.read(MIME_SNIFF_BYTES)
+    upload_file.file.seek(0)
+    return get_buffer_extension(head)
+
+def delete_temp_file(temp_file_path: Optional[str]) -> None:
+    """Delete a temporary file, logging instead of raising on failure."""
+    if temp_file_path and os.path.exists(temp_file_path):
+        try:
+            os.unlink(temp_file_path)
+            logger.debug(f"Temporary file deleted: {temp_file_path}")
+        except Exception as e:
+            logger.error(f"Error deleting temporary file {temp_file_path}: {str(e)}")
+
+def process_uploaded_file(source: Union[str, bytes], file_ext: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE, chunk_overlap: int = DEFAULT_CHUNK_OVERLAP) -> List[Document]:
+    """
+    Process an upload: load and chunk it.
+    
+    Takes the file's bytes, or a temp file path for formats whose loaders need one,
+    rather than an UploadFile so it can run in a worker process.
+    """
+    source_name = source if isinstance(source, str) else '<upload>'
+    try:
         # Verify the file has content
-        file_size = os.path.getsize(temp_file_path)
+        file_size = os.path.getsize(source) if isinstance(source, str) else len(source)
         if file_size == 0:
             raise ValueError("Uploaded file is empty")
             
-        logger.info(f"Temporary file saved: {temp_file_path} (size: {file_size} bytes)")
-        
-        # Load the document
-        documents = load_document(temp_file_path)
-        if not documents:
-            raise ValueError("No content could be extracted from the file")
+        logger.info(f"Parsing file: {source_name} (size: {file_size} bytes)")
         
-        logger.info(f"Successfully loaded {len(documents)} document(s)")
-        
-        # Chunk the document
+        # Chunk each page or slide as it is loaded instead of loading the whole document first
+        documents = iter_documents(source if isinstance(source, str) else io.BytesIO(source), file_ext)
         chunks = chunk_documents(documents, chunk_size, chunk_overlap)
         if not chunks:
-            raise ValueError("No chunks could be created from the document")
+            raise ValueError("No content could be extracted from the file")
             
         logger.info(f"Created {len(chunks)} chunks from the document")
         return chunks
         
     except Exception as e:
-        error_msg = f"Error processing file {getattr(upload_file, 'filename', 'unknown')}: {str(e)}"
+        error_msg = f"Error processing file {os.path.basename(source_name)}: {str(e)}"
         logger.error(error_msg, exc_info=True)
         raise ValueError(error_msg) from e
-        
-    finally:
-        # Clean up the temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-                logger.debug(f"Temporary file deleted: {temp_file_path}")
-            except Exception as e:
-                logger.error(f"Error deleting temporary file {temp_file_path}: {str(e)}")
+
+# Last formatted timestamp as [unix second, ISO string]
+_timestamp_cache = [0, ""]
+
+def utc_timestamp() -> str:
+    """Return the current UTC time as a naive ISO string, formatted at most once per second."""
+    second = int(time.time())
+    if second != _timestamp_cache[0]:
+        formatted = datetime.fromtimestamp(second, timezone.utc).replace(tzinfo=None).isoformat()
+        _timestamp_cache[:] = [second, formatted]
+    return _timestamp_cache[1]
+
+# Slide fields copied into vector metadata
+_SLIDE_METADATA_FIELDS = ('slide_name', 'course_name', 'subject_name', 'description')
 
 def generate_slide_metadata(slide: Optional[dict] = None) -> dict:
     """Generate metadata dictionary for a slide."""
-    now = datetime.utcnow().isoformat()
+    now = utc_timestamp()
     if slide is None:
         return {
             "slide_name": "",
@@ -180,31 +471,45 @@ def generate_slide_metadata(slide: Optional[dict] = None) -> dict:
             "created_at": now,
             "updated_at": now
         }
+    # Read dicts and model instances through a plain dict lookup; only objects
+    # without an instance __dict__ (e.g. __slots__ classes) need attribute lookups
+    fields = slide if isinstance(slide, dict) else getattr(slide, '__dict__', None)
+    if fields is None:
+        fields = {name: getattr(slide, name) for name in _SLIDE_METADATA_FIELDS if hasattr(slide, name)}
+    get = fields.get
     return {
-        "slide_name": getattr(slide, 'slide_name', ''),
-        "course_name": getattr(slide, 'course_name', ''),
-        "subject_name": getattr(slide, 'subject_name', ''),
-        "description": getattr(slide, 'description', '') or "",
+        "slide_name": get('slide_name', ''),
+        "course_name": get('course_name', ''),
+        "subject_name": get('subject_name', ''),
+        "description": get('description', '') or "",
         "created_at": now,
         "updated_at": now
     }
 
+def iter_batches(items: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """Yield successive lists of at most batch_size items, preserving order."""
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    iterator = iter(items)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
 def generate_slide_id() -> str:
     """Generate a unique ID for a slide."""
-    return str(uuid.uuid4())
+    return uuid.uuid4().hex
+
+def generate_chunk_id(text: str, *scope: str) -> str:
+    """
+    Generate a deterministic ID for a chunk from its whitespace-normalized content.
+    
+    The scope (e.g. course, subject, slide and file name) is hashed in too, so identical
+    text uploaded under a different scope gets its own vector.
+    """
+    normalized = " ".join(text.split())
+    key = "\x1f".join((*scope, normalized))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
 
 def extract_text_from_pdf(file_content: bytes) -> str:
     """Legacy function for backward compatibility."""
-    try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(file_content)
-            tmp_path = tmp.name
-        
-        pdf_reader = PyPDF2.PdfReader(tmp_path)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text
-    finally:
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
\ No newline at end of file
+    # Reads the PDF from memory through the same extractor as load_document
+    return "".join(page_text + "\n" for page_text in iter_pdf_pages(file_content))
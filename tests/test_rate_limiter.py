@@ -0,0 +1,103 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app import rate_limiter
+from app.rate_limiter import RateLimiter
+
+
+class FakeClock:
+    """Monotonic clock whose sleeps advance time instantly."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(rate_limiter, "asyncio", SimpleNamespace(
+        Semaphore=asyncio.Semaphore,
+        Lock=asyncio.Lock,
+        sleep=clock.sleep,
+    ))
+    return clock
+
+
+def acquire_all(limiter: RateLimiter, token_counts) -> None:
+    async def run():
+        for tokens in token_counts:
+            async with limiter.acquire(tokens=tokens):
+                pass
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("limits", [(0, 10, 10), (1, 0, 10), (1, 10, 0)])
+def test_rejects_limits_below_one(limits):
+    with pytest.raises(ValueError):
+        RateLimiter(*limits)
+
+
+def test_requests_within_budget_do_not_wait(clock):
+    acquire_all(RateLimiter(1, 3, 1000), [0, 0, 0])
+    assert clock.sleeps == []
+
+
+def test_waits_for_request_allowance_to_refill(clock):
+    # Two requests per minute: the third has to wait half a minute for the refill
+    acquire_all(RateLimiter(1, 2, 1000), [0, 0, 0])
+    assert clock.sleeps == [pytest.approx(30)]
+
+
+def test_waits_for_token_allowance_to_refill(clock):
+    acquire_all(RateLimiter(1, 100, 100), [100, 50])
+    assert clock.sleeps == [pytest.approx(30)]
+
+
+def test_allowance_is_capped_at_one_minute(clock):
+    limiter = RateLimiter(1, 2, 1000)
+    acquire_all(limiter, [0, 0])
+
+    # Ten idle minutes still only bank one minute's worth of requests
+    clock.now += 600
+    acquire_all(limiter, [0, 0, 0])
+    assert clock.sleeps == [pytest.approx(30)]
+
+
+def test_request_larger_than_budget_is_capped(clock):
+    limiter = RateLimiter(1, 10, 100)
+    acquire_all(limiter, [500])
+    assert clock.sleeps == []
+
+    acquire_all(limiter, [500])
+    assert clock.sleeps == [pytest.approx(60)]
+
+
+def test_limits_concurrency(clock):
+    limiter = RateLimiter(2, 1000, 1000)
+    in_flight = 0
+    peak = 0
+
+    async def call():
+        nonlocal in_flight, peak
+        async with limiter.acquire():
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+
+    async def run():
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    asyncio.run(run())
+    assert peak == 2
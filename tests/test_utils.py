@@ -0,0 +1,269 @@
+import io
+import re
+import zipfile
+
+import pytest
+from langchain.schema import Document
+
+from app import utils
+
+
+class WordEncoding:
+    """Stand-in tokenizer: each token is one word together with its leading whitespace."""
+
+    def __init__(self):
+        self.vocab = []
+        self.ids = {}
+
+    def encode(self, text, disallowed_special=()):
+        return [self._token_id(piece) for piece in re.findall(r"\s*\S+|\s+", text)]
+
+    def decode_with_offsets(self, tokens):
+        offsets = []
+        position = 0
+        for token in tokens:
+            offsets.append(position)
+            position += len(self.vocab[token])
+        return "".join(self.vocab[token] for token in tokens), offsets
+
+    def _token_id(self, piece):
+        if piece not in self.ids:
+            self.ids[piece] = len(self.vocab)
+            self.vocab.append(piece)
+        return self.ids[piece]
+
+
+@pytest.fixture
+def encoding(monkeypatch):
+    encoding = WordEncoding()
+    monkeypatch.setattr(utils, "_get_token_encoding", lambda: encoding)
+    return encoding
+
+
+@pytest.fixture
+def cl100k():
+    """The real cl100k_base tokenizer; skipped when it cannot be loaded (e.g. offline)."""
+    tiktoken = pytest.importorskip("tiktoken")
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        pytest.skip(f"cl100k_base encoding unavailable: {e}")
+
+
+def words(text):
+    return text.split()
+
+
+def make_text(word_count, paragraph_words=None):
+    """Unique numbered words, split into paragraphs of paragraph_words if given."""
+    parts = []
+    for i in range(word_count):
+        if paragraph_words and i and i % paragraph_words == 0:
+            parts.append("\n\n")
+        elif i:
+            parts.append(" ")
+        parts.append(f"w{i}")
+    return "".join(parts)
+
+
+def zip_bytes(*names, first_entry_size=0):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as zf:
+        zf.writestr("[Content_Types].xml", "x" * first_entry_size)
+        for name in names:
+            zf.writestr(name, "<xml/>")
+    return buffer.getvalue()
+
+
+# Signature sniffing
+
+def test_sniff_pdf():
+    assert utils._sniff_extension(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n") == ".pdf"
+
+
+@pytest.mark.parametrize("part, ext", [
+    ("word/document.xml", ".docx"),
+    ("ppt/presentation.xml", ".pptx"),
+    ("xl/workbook.xml", ".xlsx"),
+])
+def test_sniff_ooxml(part, ext):
+    assert utils._sniff_extension(zip_bytes(part)[:utils.MIME_SNIFF_BYTES]) == ext
+
+
+def test_sniff_unknown_zip():
+    assert utils._sniff_extension(zip_bytes("data/file.bin")) is None
+
+
+def test_file_extension_reads_zip_directory_past_the_header(tmp_path):
+    # The main part's name falls outside the sniffed header
+    content = zip_bytes("word/document.xml", first_entry_size=2 * utils.MIME_SNIFF_BYTES)
+    assert utils._sniff_extension(content[:utils.MIME_SNIFF_BYTES]) is None
+
+    path = tmp_path / "upload"
+    path.write_bytes(content)
+    assert utils.get_file_extension(str(path)) == ".docx"
+
+
+@pytest.mark.parametrize("stream, ext", [
+    ("WordDocument", ".doc"),
+    ("PowerPoint Document", ".ppt"),
+    ("Workbook", ".xls"),
+])
+def test_sniff_ole(stream, ext):
+    head = utils._OLE_SIGNATURE + b"\x00" * 504 + stream.encode("utf-16-le")
+    assert utils._sniff_extension(head) == ext
+
+
+@pytest.mark.parametrize("head", [
+    b"Plain lecture notes\n",
+    "Unicode text: café über".encode("utf-8"),
+    # A multi-byte character cut off by the header boundary
+    "naïve".encode("utf-8")[:3],
+])
+def test_sniff_text(head):
+    assert utils._sniff_extension(head) == ".txt"
+
+
+@pytest.mark.parametrize("head", [b"", b"\x00\x01\x02\x03", b"\xff\xfe\xfa\xfb"])
+def test_sniff_binary_or_empty(head):
+    assert utils._sniff_extension(head) is None
+
+
+# Document loading
+
+def test_xlsx_rows_keep_cell_text_and_skip_blank_rows():
+    openpyxl = pytest.importorskip("openpyxl")
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["Path", "C:\\temp\\x", None, "multi\nline"])
+    sheet.append([None, None, None])
+    sheet.append([None, 3.5, None, '"quoted"'])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+
+    documents = utils.load_document(buffer, ".xlsx")
+
+    assert [document.page_content for document in documents] == [
+        'Path C:\\temp\\x multi\nline\n3.5 "quoted"\n'
+    ]
+
+
+# Text splitting
+
+def test_split_short_text_is_stripped(encoding):
+    assert utils.fast_recursive_split("  one two three \n", 10, 2) == ["one two three"]
+
+
+@pytest.mark.parametrize("text", ["", "   ", "\n\n \t\n", " " * 5000])
+def test_split_empty_or_whitespace(encoding, text):
+    assert utils.fast_recursive_split(text, 10, 2) == []
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(50, 0), (50, 10), (50, 49), (7, 3)])
+def test_split_bounds_and_covers_text(encoding, chunk_size, chunk_overlap):
+    text = make_text(1000, paragraph_words=23)
+    chunks = utils.fast_recursive_split(text, chunk_size, chunk_overlap)
+
+    for chunk in chunks:
+        assert len(encoding.encode(chunk)) <= chunk_size
+
+    # Every word appears, and chunks advance through the text in order
+    chunk_words = [words(chunk) for chunk in chunks]
+    assert {word for chunk in chunk_words for word in chunk} == set(words(text))
+    starts = [int(chunk[0][1:]) for chunk in chunk_words]
+    assert starts == sorted(set(starts))
+
+    # Each chunk starts chunk_size - chunk_overlap tokens after the last, or right after
+    # it ends when a break cut it shorter than that
+    step = min(chunk_size - chunk_overlap, chunk_size // 2)
+    assert len(chunks) <= -(-1000 // step)
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(50, 50), (512, 600)])
+def test_split_rejects_overlap_not_smaller_than_size(encoding, chunk_size, chunk_overlap):
+    with pytest.raises(ValueError):
+        utils.fast_recursive_split(make_text(1000), chunk_size, chunk_overlap)
+
+
+@pytest.mark.parametrize("chunk_overlap", [0, 5, 10])
+def test_split_overlap_is_bounded(encoding, chunk_overlap):
+    chunks = utils.fast_recursive_split(make_text(300), 40, chunk_overlap)
+    for previous, current in zip(chunks, chunks[1:]):
+        shared = set(words(previous)) & set(words(current))
+        assert len(shared) <= chunk_overlap
+
+
+def test_split_prefers_paragraph_breaks(encoding):
+    text = make_text(120, paragraph_words=30)
+    chunks = utils.fast_recursive_split(text, 50, 0)
+    assert chunks == [paragraph.strip() for paragraph in text.split("\n\n")]
+
+
+def test_chunk_documents_packs_small_pages(encoding):
+    pages = [
+        Document(page_content=" ".join(f"p{page}w{i}" for i in range(50)), metadata={"page": page})
+        for page in range(40)
+    ]
+    chunks = utils.chunk_documents(pages, 512, 64)
+
+    assert len(chunks) == 4
+    assert [chunk.metadata["page"] for chunk in chunks] == [0, 10, 20, 30]
+    for chunk in chunks:
+        assert len(encoding.encode(chunk.page_content)) <= 512
+
+
+def test_chunk_documents_splits_large_pages(encoding):
+    pages = [Document(page_content=make_text(1200), metadata={"page": 0})]
+    chunks = utils.chunk_documents(pages, 512, 64)
+
+    assert len(chunks) == 3
+    for chunk in chunks:
+        assert len(encoding.encode(chunk.page_content)) <= 512
+
+
+def test_chunk_documents_tokenizes_each_page_once(encoding, monkeypatch):
+    encoded = []
+    encode = encoding.encode
+    monkeypatch.setattr(encoding, "encode", lambda text, **kwargs: encoded.append(text) or encode(text, **kwargs))
+    pages = [Document(page_content=make_text(200 * (page + 1)), metadata={"page": page}) for page in range(4)]
+    utils.chunk_documents(pages, 512, 64)
+
+    assert sorted(text for text in encoded if text != "\n\n") == sorted(page.page_content for page in pages)
+
+
+# Text splitting with the real tokenizer
+
+def test_split_multibyte_text_with_real_tokenizer(cl100k):
+    text = " ".join(f"{i} café naïve 日本語のテキスト 🎉 über" for i in range(400))
+    chunks = utils.fast_recursive_split(text, 64, 0)
+
+    assert len(chunks) > 1
+    assert "".join("".join(chunks).split()) == "".join(text.split())
+    for chunk in chunks:
+        assert "\ufffd" not in chunk
+        # Re-encoding a slice may merge a token differently at its edges
+        assert len(cl100k.encode(chunk)) <= 64 + 2
+
+
+def test_split_cuts_inside_multibyte_characters(cl100k):
+    # No separators, and emoji take several tokens each, so cuts fall inside characters
+    text = "🎉🎊👩‍🏫日本語" * 300
+    chunks = utils.fast_recursive_split(text, 64, 0)
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == text
+
+
+def test_split_falls_back_when_offsets_do_not_line_up(cl100k, monkeypatch):
+    # A lone surrogate is encoded as U+FFFD, so decoding does not reproduce the text
+    text = " ".join(f"word{i} \ud800" for i in range(400))
+    splitter_calls = []
+    get_splitter = utils._get_splitter
+    monkeypatch.setattr(utils, "_get_splitter", lambda *args: splitter_calls.append(args) or get_splitter(*args))
+
+    chunks = utils.fast_recursive_split(text, 64, 8)
+
+    assert splitter_calls == [(64, 8)]
+    assert len(chunks) > 1
+    assert {word for chunk in chunks for word in words(chunk)} == set(words(text))